@@ -1,14 +1,116 @@
 import sqlite3
 import os
+import threading
+import time
 
 DB_NAME = "database.db"
 
+# Instrumentation hooks, empty unless something (e.g. metrics.py) registers one.
+# connection_hooks: hook(conn), called for every new connection
+# query_hooks: hook(cursor, seconds), called after each execute/fetch call
+#              and each row read by iterating the cursor; cursor.sql and
+#              cursor.parameters hold the statement it ran and cursor.elapsed
+#              the time spent on it so far (execute + fetches)
+connection_hooks = []
+query_hooks = []
+
+_open_lock = threading.Lock()
+_open_connections = 0
+
+
+def open_connections():
+    return _open_connections
+
+
+class Cursor(sqlite3.Cursor):
+    sql = None
+    parameters = None
+    elapsed = 0.0
+
+    def _timed(self, method, *args):
+        if not query_hooks:
+            return method(*args)
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.elapsed += elapsed
+            for hook in query_hooks:
+                hook(self, elapsed)
+
+    def execute(self, sql, parameters=()):
+        self.sql, self.parameters, self.elapsed = sql, parameters, 0.0
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.sql, self.parameters, self.elapsed = sql, None, 0.0
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._timed(super().fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed(super().fetchmany)
+        return self._timed(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+    def __next__(self):
+        # for row in conn.execute(...)
+        return self._timed(super().__next__)
+
+
+class Connection(sqlite3.Connection):
+    # sqlite3.Connection.execute() always uses the base Cursor, so route the
+    # shortcuts through cursor() to get timings for them too
+    def __init__(self, *args, **kwargs):
+        global _open_connections
+        super().__init__(*args, **kwargs)
+        self._is_open = True
+        with _open_lock:
+            _open_connections += 1
+
+    def cursor(self, factory=Cursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def _forget(self):
+        global _open_connections
+        if getattr(self, "_is_open", False):
+            self._is_open = False
+            with _open_lock:
+                _open_connections -= 1
+
+    def close(self):
+        self._forget()
+        super().close()
+
+    def __del__(self):
+        # Handlers that hit an exception sometimes never call close(). Only
+        # fix the count here: __del__ may run on another thread (cyclic GC,
+        # shutdown), where close() raises ProgrammingError. sqlite3 closes
+        # the handle itself when the object is freed.
+        self._forget()
+
 
 def get_db_connection():
-    conn = sqlite3.connect(os.path.join(os.path.dirname(__file__), DB_NAME))
+    conn = sqlite3.connect(
+        os.path.join(os.path.dirname(__file__), DB_NAME), factory=Connection
+    )
     conn.row_factory = sqlite3.Row
+    for hook in connection_hooks:
+        hook(conn)
     return conn
 
+
 def init_db():
     conn = get_db_connection()
     c = conn.cursor()
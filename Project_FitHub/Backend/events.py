@@ -0,0 +1,108 @@
+import json
+import os
+import queue
+import threading
+
+# Live dashboard updates (Server-Sent Events)
+# A tiny in-process pub/sub: every open /events stream owns a bounded queue,
+# and the logging endpoints publish deltas to the queues of that user.
+
+# Concurrent SSE streams per worker process, in total and for one user (tabs)
+MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", 50))
+MAX_STREAMS_PER_USER = int(os.environ.get("SSE_MAX_STREAMS_PER_USER", 5))
+QUEUE_SIZE = 20  # pending events per stream before we start dropping
+HEARTBEAT_SECONDS = 15
+
+
+class EventBroker:
+    def __init__(
+        self,
+        max_streams=MAX_STREAMS,
+        max_per_user=MAX_STREAMS_PER_USER,
+        queue_size=QUEUE_SIZE,
+    ):
+        self.max_streams = max_streams
+        self.max_per_user = max_per_user
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set of queues
+        self._count = 0
+
+    def subscribe(self, user_id):
+        """Register a new stream for user_id.
+
+        Returns None if the worker or the user already has too many streams.
+        """
+        with self._lock:
+            subs = self._subscribers.get(user_id, ())
+            if self._count >= self.max_streams or len(subs) >= self.max_per_user:
+                return None
+            q = queue.Queue(maxsize=self.queue_size)
+            self._subscribers.setdefault(user_id, set()).add(q)
+            self._count += 1
+            return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            subs = self._subscribers.get(user_id)
+            if subs and q in subs:
+                subs.discard(q)
+                self._count -= 1
+                if not subs:
+                    del self._subscribers[user_id]
+
+    def has_subscribers(self, user_id):
+        with self._lock:
+            return user_id in self._subscribers
+
+    def stream_count(self):
+        with self._lock:
+            return self._count
+
+    def publish(self, user_id, event, data):
+        with self._lock:
+            subs = list(self._subscribers.get(user_id, ()))
+
+        for q in subs:
+            try:
+                q.put_nowait((event, data))
+            except queue.Full:
+                # Slow client: drop the oldest pending event so the newest
+                # state always gets through (deltas carry absolute values).
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    q.put_nowait((event, data))
+                except queue.Full:
+                    pass
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream(broker, user_id, q, initial=None, heartbeat=HEARTBEAT_SECONDS):
+    """Generator yielding SSE frames until the client disconnects."""
+    try:
+        # Tell EventSource to wait a bit before reconnecting
+        yield "retry: 5000\n\n"
+        if initial is not None:
+            yield format_sse("snapshot", initial)
+
+        while True:
+            try:
+                event, data = q.get(timeout=heartbeat)
+            except queue.Empty:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": heartbeat\n\n"
+                continue
+            yield format_sse(event, data)
+    finally:
+        # Runs when the WSGI server closes the generator on disconnect;
+        # unsubscribe() is a no-op if the response close already did it
+        broker.unsubscribe(user_id, q)
+
+
+broker = EventBroker()
@@ -0,0 +1,200 @@
+import functools
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, jsonify, make_response, request
+
+from Backend.database import get_db_connection
+
+# Idempotency-Key support for the logging endpoints
+# A client sends the same Idempotency-Key header when it retries a request.
+# The first successful response is stored in idempotency_keys inside the same
+# transaction as the log rows, so a replay can never double-count. Recent
+# keys are also kept in a small in-memory LRU to skip the database lookup.
+
+HEADER = "Idempotency-Key"
+CACHE_SIZE = 1024
+TTL_SECONDS = 24 * 60 * 60
+CLEANUP_INTERVAL = 10 * 60
+
+
+class IdempotencyStore:
+    def __init__(self, cache_size=CACHE_SIZE, ttl=TTL_SECONDS):
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cache = (
+            OrderedDict()
+        )  # (endpoint, key) -> (fingerprint, body, status, created_at)
+        self._in_flight = set()
+        self._last_cleanup = 0
+
+    @staticmethod
+    def ensure_table(conn):
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS idempotency_keys (
+            endpoint TEXT NOT NULL,
+            key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (endpoint, key)
+        )"""
+        )
+        # Keeps the TTL cleanup from scanning the table inside a log transaction
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_idempotency_created ON idempotency_keys (created_at)"
+        )
+
+    def cache(self, cache_key, entry):
+        with self._lock:
+            self._cache[cache_key] = entry
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def lookup(self, endpoint, key):
+        """Return (fingerprint, body, status) for a stored response, or None."""
+        cache_key = (endpoint, key)
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(cache_key)
+            if entry and now - entry[3] < self.ttl:
+                self._cache.move_to_end(cache_key)
+                return entry[:3]
+
+        conn = get_db_connection()
+        row = conn.execute(
+            "SELECT fingerprint, status, response, created_at FROM idempotency_keys WHERE endpoint = ? AND key = ? AND created_at > ?",
+            (endpoint, key, now - self.ttl),
+        ).fetchone()
+        conn.close()
+        if not row:
+            return None
+        entry = (
+            row["fingerprint"],
+            json.loads(row["response"]),
+            row["status"],
+            row["created_at"],
+        )
+        self.cache(cache_key, entry)
+        return entry[:3]
+
+    def save(self, conn, endpoint, key, fingerprint, body, status):
+        """Record a response. Must run before the caller's commit.
+
+        Returns the cache entry; it is only cached once the commit succeeded.
+        """
+        now = time.time()
+        # An expired row for this key would otherwise fail the INSERT below
+        conn.execute(
+            "DELETE FROM idempotency_keys WHERE endpoint = ? AND key = ? AND created_at <= ?",
+            (endpoint, key, now - self.ttl),
+        )
+        conn.execute(
+            "INSERT INTO idempotency_keys (endpoint, key, fingerprint, status, response, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (endpoint, key, fingerprint, status, json.dumps(body), now),
+        )
+
+        if now - self._last_cleanup > CLEANUP_INTERVAL:
+            self._last_cleanup = now
+            conn.execute(
+                "DELETE FROM idempotency_keys WHERE created_at <= ?", (now - self.ttl,)
+            )
+        return (fingerprint, body, status, now)
+
+    def begin(self, endpoint, key):
+        with self._lock:
+            if (endpoint, key) in self._in_flight:
+                return False
+            self._in_flight.add((endpoint, key))
+            return True
+
+    def end(self, endpoint, key):
+        with self._lock:
+            self._in_flight.discard((endpoint, key))
+
+    def in_flight_count(self):
+        with self._lock:
+            return len(self._in_flight)
+
+
+store = IdempotencyStore()
+
+
+def _replay(stored, fingerprint):
+    stored_fingerprint, body, status = stored
+    if stored_fingerprint != fingerprint:
+        return (
+            jsonify({"error": f"{HEADER} was already used with a different request"}),
+            422,
+        )
+    response = make_response(jsonify(body), status)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(view):
+    """Replay the stored response when a request repeats its Idempotency-Key.
+
+    The view must call remember(conn, body, status) before committing.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({"error": f"{HEADER} is too long"}), 400
+
+        endpoint = request.endpoint
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+        stored = store.lookup(endpoint, key)
+        if stored:
+            return _replay(stored, fingerprint)
+
+        if not store.begin(endpoint, key):
+            return (
+                jsonify({"error": f"A request with this {HEADER} is in progress"}),
+                409,
+            )
+        try:
+            g.idempotency = (endpoint, key, fingerprint)
+            g.idempotency_conflict = False
+            g.idempotency_entry = None
+            response = make_response(view(*args, **kwargs))
+
+            if g.idempotency_conflict:
+                # Another worker committed the same key first; its
+                # transaction won and ours was rolled back.
+                stored = store.lookup(endpoint, key)
+                if stored:
+                    return _replay(stored, fingerprint)
+            elif g.idempotency_entry and response.status_code < 400:
+                # The view only reports success after its commit
+                store.cache((endpoint, key), g.idempotency_entry)
+            return response
+        finally:
+            store.end(endpoint, key)
+
+    return wrapper
+
+
+def remember(conn, body, status):
+    """Store the response for the current request's Idempotency-Key, if any."""
+    info = g.get("idempotency")
+    if not info:
+        return
+    endpoint, key, fingerprint = info
+    try:
+        g.idempotency_entry = store.save(conn, endpoint, key, fingerprint, body, status)
+    except sqlite3.IntegrityError:
+        g.idempotency_conflict = True
+        raise
@@ -0,0 +1,463 @@
+import bisect
+import datetime
+import sqlite3
+import threading
+import time
+
+from Backend.database import get_db_connection
+
+# Leaderboards (streaks, workouts completed, calories burned)
+# Scores live in memory as sorted lists so top-K and "my rank" are a bisect
+# away, and every change is mirrored to leaderboard_snapshot so a restart can
+# reload without scanning the log tables. If the snapshot does not match the
+# base tables (see leaderboard_meta) it is rebuilt from them.
+#
+# Several worker processes may share the database: updates run in a
+# BEGIN IMMEDIATE transaction against the snapshot rows (never this
+# process's possibly stale copy) and stamp them with the next value of
+# leaderboard_meta.seq. Queries then fetch only the rows whose seq is newer
+# than the last one this process has seen.
+
+BOARDS = ("streak", "workouts", "calories")
+PERIODS = ("weekly", "all")
+ALL_TIME = "all"
+REFRESH_INTERVAL = 1.0  # seconds between "did another process write?" checks
+
+
+def week_start(day):
+    return (day - datetime.timedelta(days=day.weekday())).isoformat()
+
+
+def advance_streak(stored, date, week):
+    """Streak rows after a new daily log on date.
+
+    stored and the result map a period key (ALL_TIME or the Monday of the
+    week) to (best, last_date, run); weekly rows leave last_date empty.
+    """
+    best, last_date, run = stored.get(ALL_TIME, (0, None, 0))
+    is_next = (
+        last_date is not None
+        and (
+            datetime.date.fromisoformat(date) - datetime.date.fromisoformat(last_date)
+        ).days
+        == 1
+    )
+    run = run + 1 if is_next else 1
+    result = {ALL_TIME: (max(best, run), date, run)}
+
+    if date >= week:
+        week_best, _, week_run = stored.get(week, (0, None, 0))
+        week_run = week_run + 1 if is_next and last_date >= week else 1
+        result[week] = (max(week_best, week_run), None, week_run)
+    return result
+
+
+class Leaderboard:
+    def __init__(self, scores=None):
+        self._scores = dict(scores or {})  # user_id -> score
+        # sorted (-score, user_id); one sort instead of an insort per user
+        self._order = sorted(
+            (-score, user_id) for user_id, score in self._scores.items()
+        )
+
+    def __len__(self):
+        return len(self._order)
+
+    def items(self):
+        return self._scores.items()
+
+    def score(self, user_id):
+        return self._scores.get(user_id)
+
+    def set(self, user_id, score):
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        self.remove(user_id)
+        self._scores[user_id] = score
+        bisect.insort(self._order, (-score, user_id))
+
+    def remove(self, user_id):
+        old = self._scores.pop(user_id, None)
+        if old is not None:
+            i = bisect.bisect_left(self._order, (-old, user_id))
+            del self._order[i]
+
+    def add(self, user_id, delta):
+        new_score = self._scores.get(user_id, 0) + delta
+        self.set(user_id, new_score)
+        return new_score
+
+    def top(self, k):
+        return [(-neg, user_id) for neg, user_id in self._order[:k]]
+
+    def rank(self, user_id):
+        """1-based rank (ties share a rank), or None if the user has no score."""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        # (-score,) sorts before every (-score, user_id) entry
+        return bisect.bisect_left(self._order, (-score,)) + 1
+
+
+class Leaderboards:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards = {}
+        self._week = None
+        self._seq = None  # leaderboard_meta.seq applied so far (None: full load)
+        self._generation = None  # bumped by every rebuild
+        self._checked = 0.0
+        self._reset()
+
+    def _reset(self, scores=None):
+        scores = scores or {}
+        self._boards = {
+            (b, p): Leaderboard(scores.get((b, p))) for b in BOARDS for p in PERIODS
+        }
+
+    def _period(self, key):
+        return "all" if key == ALL_TIME else "weekly"
+
+    def _roll_week(self, conn):
+        current = week_start(datetime.date.today())
+        if current == self._week:
+            return
+        self._week = current
+        for b in BOARDS:
+            self._boards[(b, "weekly")] = Leaderboard()
+        # Another process may have stored rows for the new week already
+        self._seq = None
+
+        # Past weeks are never read again
+        try:
+            self._write(
+                conn,
+                None,
+                lambda conn, seq: conn.execute(
+                    "DELETE FROM leaderboard_snapshot WHERE period != ? AND period < ?",
+                    (ALL_TIME, current),
+                ),
+            )
+        except sqlite3.Error as e:
+            print(f"Could not prune past weeks from the leaderboard snapshot: {e}")
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def ensure_tables(conn):
+        columns = [
+            r["name"] for r in conn.execute("PRAGMA table_info(leaderboard_snapshot)")
+        ]
+        if columns and "seq" not in columns:
+            # Snapshot from before seq existed: it is derived data, so drop it
+            # and let load() rebuild it
+            conn.execute("DROP TABLE leaderboard_snapshot")
+            conn.execute("DROP TABLE IF EXISTS leaderboard_meta")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS leaderboard_snapshot (
+            board TEXT NOT NULL,
+            period TEXT NOT NULL, -- 'all' or the Monday of the week
+            user_id TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            last_date TEXT, -- streak board only
+            run INTEGER, -- streak board only
+            seq INTEGER NOT NULL, -- leaderboard_meta.seq of the last change
+            PRIMARY KEY (board, period, user_id)
+        )"""
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_leaderboard_snapshot_seq ON leaderboard_snapshot (seq)"
+        )
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS leaderboard_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )"""
+        )
+
+    @staticmethod
+    def _meta(conn):
+        rows = conn.execute("SELECT key, value FROM leaderboard_meta").fetchall()
+        return {r["key"]: r["value"] for r in rows}
+
+    @staticmethod
+    def _source_counts(conn):
+        workouts = conn.execute("SELECT count(*) FROM user_workouts").fetchone()[0]
+        days = conn.execute("SELECT count(*) FROM daily_logs").fetchone()[0]
+        return {"workouts_seen": workouts, "days_seen": days}
+
+    def load(self, conn):
+        """Load from the snapshot, rebuilding it first if it is stale."""
+        self.ensure_tables(conn)
+        meta = self._meta(conn)
+        counts = self._source_counts(conn)
+        if "seq" not in meta or any(meta.get(k) != v for k, v in counts.items()):
+            self.rebuild(conn)
+            return
+
+        with self._lock:
+            self._roll_week(conn)
+            self._load_snapshot(conn, meta)
+
+    def _load_snapshot(self, conn, meta):
+        rows = conn.execute(
+            "SELECT board, period, user_id, score FROM leaderboard_snapshot WHERE period IN (?, ?)",
+            (ALL_TIME, self._week),
+        ).fetchall()
+        scores = {}
+        for r in rows:
+            key = (r["board"], self._period(r["period"]))
+            scores.setdefault(key, {})[r["user_id"]] = r["score"]
+        self._reset(scores)
+        self._seq = meta.get("seq", 0)
+        self._generation = meta.get("generation")
+        self._checked = time.monotonic()
+
+    def rebuild(self, conn):
+        """Recompute every board from user_workouts/daily_logs and rewrite the snapshot."""
+        self.ensure_tables(conn)
+        with self._lock:
+            self._roll_week(conn)
+            week = self._week
+            scores = {(b, p): {} for b in BOARDS for p in PERIODS}
+            snapshot = []
+
+            # Reads and writes share one write transaction, so a log
+            # committed by another process is either counted or not yet in
+            # the tables (its record_* call then waits for us)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    """SELECT uw.user_id,
+                        count(*) AS workouts,
+                        SUM(uw.date >= ?) AS week_workouts,
+                        SUM(COALESCE(w.calories_burn, 0)) AS calories,
+                        SUM(CASE WHEN uw.date >= ? THEN COALESCE(w.calories_burn, 0) ELSE 0 END) AS week_calories
+                    FROM user_workouts uw LEFT JOIN workouts w ON w.id = uw.workout_id
+                    GROUP BY uw.user_id""",
+                    (week, week),
+                ).fetchall()
+                for r in rows:
+                    for board, period, score in (
+                        ("workouts", "all", r["workouts"]),
+                        ("calories", "all", r["calories"]),
+                        ("workouts", "weekly", r["week_workouts"]),
+                        ("calories", "weekly", r["week_calories"]),
+                    ):
+                        if period == "weekly" and not r["week_workouts"]:
+                            continue
+                        scores[(board, period)][r["user_id"]] = score
+                        key = ALL_TIME if period == "all" else week
+                        snapshot.append((board, key, r["user_id"], score, None, None))
+
+                # Streaks need the days in order; replayed in plain dicts
+                streaks = {}
+                rows = conn.execute(
+                    "SELECT user_id, date FROM daily_logs ORDER BY user_id, date"
+                ).fetchall()
+                for r in rows:
+                    stored = streaks.get(r["user_id"], {})
+                    stored.update(advance_streak(stored, r["date"], week))
+                    streaks[r["user_id"]] = stored
+                for user_id, stored in streaks.items():
+                    for key, (best, last_date, run) in stored.items():
+                        if key not in (ALL_TIME, week):
+                            continue
+                        scores[("streak", self._period(key))][user_id] = best
+                        snapshot.append(("streak", key, user_id, best, last_date, run))
+
+                meta = self._meta(conn)
+                meta.update(self._source_counts(conn))
+                meta["seq"] = meta.get("seq", 0) + 1
+                meta["generation"] = meta.get("generation", 0) + 1
+
+                conn.execute("DELETE FROM leaderboard_snapshot")
+                conn.executemany(
+                    "INSERT INTO leaderboard_snapshot (board, period, user_id, score, last_date, run, seq) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [row + (meta["seq"],) for row in snapshot],
+                )
+                conn.execute("DELETE FROM leaderboard_meta")
+                conn.executemany(
+                    "INSERT INTO leaderboard_meta (key, value) VALUES (?, ?)",
+                    meta.items(),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            self._reset(scores)
+            self._seq = meta["seq"]
+            self._generation = meta["generation"]
+            self._checked = time.monotonic()
+        print(f"Rebuilt leaderboards ({len(snapshot)} entries).")
+
+    def _write(self, conn, meta_key, update):
+        """Run update(conn, seq) in one write transaction and bump meta_key.
+
+        BEGIN IMMEDIATE takes the write lock up front, so the snapshot rows
+        update() reads cannot change under it from another process. update()
+        must stamp the rows it writes with seq.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = self._meta(conn).get("seq", 0)
+            result = update(conn, seq + 1)
+            conn.execute(
+                "UPDATE leaderboard_meta SET value = value + 1 WHERE key IN (?, 'seq')",
+                (meta_key,),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if self._seq == seq:
+            # Nobody else wrote since our last refresh, so we are current;
+            # otherwise the next refresh fetches their rows (and ours again)
+            self._seq = seq + 1
+        return result
+
+    # ------------------------------------------------------------------
+    # Incremental updates (call after the log row is committed)
+    # Memory is only changed after the commit, from the stored rows.
+    # ------------------------------------------------------------------
+
+    def record_workout(self, conn, user_id, date, calories):
+        with self._lock:
+            self._roll_week(conn)
+            keys = [ALL_TIME] + ([self._week] if date >= self._week else [])
+
+            def update(conn, seq):
+                # Deltas, so concurrent processes add up instead of overwriting
+                conn.executemany(
+                    """INSERT INTO leaderboard_snapshot (board, period, user_id, score, seq)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (board, period, user_id) DO UPDATE SET
+                        score = score + excluded.score, seq = excluded.seq""",
+                    [
+                        (board, key, user_id, delta, seq)
+                        for key in keys
+                        for board, delta in (
+                            ("workouts", 1),
+                            ("calories", calories or 0),
+                        )
+                    ],
+                )
+                return conn.execute(
+                    f"""SELECT board, period, score FROM leaderboard_snapshot
+                    WHERE user_id = ? AND board IN ('workouts', 'calories')
+                    AND period IN ({','.join('?' * len(keys))})""",
+                    (user_id, *keys),
+                ).fetchall()
+
+            for r in self._write(conn, "workouts_seen", update):
+                self._boards[(r["board"], self._period(r["period"]))].set(
+                    user_id, r["score"]
+                )
+
+    def record_day(self, conn, user_id, date):
+        """A new daily_logs row was created for user_id on date."""
+        with self._lock:
+            self._roll_week(conn)
+            week = self._week
+
+            def update(conn, seq):
+                # Continue the streak from the stored state, not our copy
+                rows = conn.execute(
+                    """SELECT period, score, last_date, run FROM leaderboard_snapshot
+                    WHERE board = 'streak' AND user_id = ? AND period IN (?, ?)""",
+                    (user_id, ALL_TIME, week),
+                ).fetchall()
+                stored = {
+                    r["period"]: (r["score"], r["last_date"], r["run"]) for r in rows
+                }
+                streak = advance_streak(stored, date, week)
+                conn.executemany(
+                    """INSERT INTO leaderboard_snapshot (board, period, user_id, score, last_date, run, seq)
+                    VALUES ('streak', ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (board, period, user_id) DO UPDATE SET
+                        score = excluded.score, last_date = excluded.last_date,
+                        run = excluded.run, seq = excluded.seq""",
+                    [
+                        (key, user_id, best, last_date, run, seq)
+                        for key, (best, last_date, run) in streak.items()
+                    ],
+                )
+                return streak
+
+            for key, (best, _, _) in self._write(conn, "days_seen", update).items():
+                self._boards[("streak", self._period(key))].set(user_id, best)
+
+    def _refresh_if_stale(self):
+        # Roll the week and pick up other processes' writes (lock held)
+        now = time.monotonic()
+        if (
+            self._seq is not None
+            and now - self._checked < REFRESH_INTERVAL
+            and self._week == week_start(datetime.date.today())
+        ):
+            return
+        self._checked = now
+        conn = get_db_connection()
+        try:
+            self._roll_week(conn)
+            meta = self._meta(conn)
+            if self._seq is None or meta.get("generation") != self._generation:
+                self._load_snapshot(conn, meta)
+            elif meta.get("seq", 0) != self._seq:
+                rows = conn.execute(
+                    """SELECT board, period, user_id, score FROM leaderboard_snapshot
+                    WHERE seq > ? AND period IN (?, ?)""",
+                    (self._seq, ALL_TIME, self._week),
+                ).fetchall()
+                # Scores are absolute, so a row committed after the meta read
+                # and applied again on the next refresh does no harm
+                for r in rows:
+                    self._boards[(r["board"], self._period(r["period"]))].set(
+                        r["user_id"], r["score"]
+                    )
+                self._seq = meta["seq"]
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def top(self, board, period, k):
+        with self._lock:
+            self._refresh_if_stale()
+            lb = self._boards[(board, period)]
+            entries = lb.top(k)
+        # Ties share a rank (1, 2, 2, 4, ...)
+        ranked = []
+        for i, (score, user_id) in enumerate(entries):
+            if ranked and ranked[-1]["score"] == score:
+                rank = ranked[-1]["rank"]
+            else:
+                rank = i + 1
+            ranked.append({"rank": rank, "user_id": user_id, "score": score})
+        return ranked
+
+    def rank(self, board, period, user_id):
+        with self._lock:
+            self._refresh_if_stale()
+            lb = self._boards[(board, period)]
+            return {
+                "rank": lb.rank(user_id),
+                "score": lb.score(user_id) or 0,
+                "total": len(lb),
+            }
+
+
+leaderboards = Leaderboards()
+
+
+if __name__ == "__main__":
+    # python -m Backend.leaderboard  -> force a rebuild from the base tables
+    conn = get_db_connection()
+    Leaderboards().rebuild(conn)
+    conn.close()
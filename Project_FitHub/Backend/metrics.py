@@ -0,0 +1,266 @@
+import bisect
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+
+from Backend import database
+
+# Prometheus-style metrics
+# Plain in-process counters/histograms rendered in the text exposition
+# format on /metrics. Each update is a dict lookup under a lock, so this is
+# cheap enough to leave on. Values are per worker process.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in sorted(items):
+            yield self.name + _labels(self.labels, label_values), value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, doc, func):
+        self.name = name
+        self.doc = doc
+        self.func = func  # evaluated at scrape time
+
+    def samples(self):
+        yield self.name, self.func()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # label_values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for label_values, entry in sorted(items):
+            cumulative = 0
+            for bound, n in zip(self.buckets, entry[:-2]):
+                cumulative += n
+                le = f'le="{_number(float(bound))}"'
+                yield f"{self.name}_bucket" + _labels(
+                    self.labels, label_values, le
+                ), cumulative
+            yield f"{self.name}_bucket" + _labels(
+                self.labels, label_values, 'le="+Inf"'
+            ), entry[-1]
+            yield f"{self.name}_sum" + _labels(self.labels, label_values), entry[-2]
+            yield f"{self.name}_count" + _labels(self.labels, label_values), entry[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.doc}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(
+    Counter(
+        "fithub_http_requests_total",
+        "HTTP requests by route, method and status code.",
+        ("route", "method", "status"),
+    )
+)
+http_latency = registry.register(
+    Histogram(
+        "fithub_http_request_duration_seconds",
+        "Time spent handling a request (until the response is returned).",
+        ("route", "method"),
+    )
+)
+sql_statements = registry.register(
+    Counter(
+        "fithub_sql_statements_total",
+        "SQL statements executed by SQLite, by route.",
+        ("route",),
+    )
+)
+sql_seconds = registry.register(
+    Counter(
+        "fithub_sql_seconds_total",
+        "Time spent in SQLite execute/fetch calls, by route.",
+        ("route",),
+    )
+)
+sql_per_request = registry.register(
+    Histogram(
+        "fithub_sql_statements_per_request",
+        "SQL statements executed per request.",
+        ("route",),
+        buckets=(1, 2, 5, 10, 25, 50, 100),
+    )
+)
+errors = registry.register(
+    Counter(
+        "fithub_errors_total",
+        "Errors that are handled and logged instead of failing the request.",
+        ("source",),
+    )
+)
+requests_in_flight = 0
+registry.register(
+    Gauge(
+        "fithub_http_requests_in_flight",
+        "Requests currently being handled.",
+        lambda: requests_in_flight,
+    )
+)
+registry.register(
+    Gauge(
+        "fithub_db_connections_open",
+        "SQLite connections opened and not yet closed.",
+        database.open_connections,
+    )
+)
+
+_in_flight_lock = threading.Lock()
+
+
+def _route():
+    rule = request.url_rule
+    # Use the route pattern, not the raw path, to keep label cardinality low
+    return rule.rule if rule is not None else "<unmatched>"
+
+
+def _count_statement(statement):
+    # EXPLAIN comes from the slow-query log, not from the route itself.
+    # SQLite currently does not trace EXPLAIN statements; don't rely on it.
+    if statement.startswith("EXPLAIN"):
+        return
+    if has_request_context() and "metrics_start" in g:
+        g.sql_statements += 1
+
+
+def _time_query(cursor, seconds):
+    if has_request_context() and "metrics_start" in g:
+        g.sql_seconds += seconds
+
+
+def _on_connect(conn):
+    conn.set_trace_callback(_count_statement)
+
+
+def _before_request():
+    global requests_in_flight
+    g.metrics_start = time.perf_counter()
+    g.sql_statements = 0
+    g.sql_seconds = 0.0
+    with _in_flight_lock:
+        requests_in_flight += 1
+
+
+def _record(status):
+    global requests_in_flight
+    start = g.pop("metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    route = _route()
+    http_requests.inc(route, request.method, str(status))
+    http_latency.observe(elapsed, route, request.method)
+    sql_statements.inc(route, amount=g.sql_statements)
+    sql_seconds.inc(route, amount=g.sql_seconds)
+    sql_per_request.observe(g.sql_statements, route)
+    with _in_flight_lock:
+        requests_in_flight -= 1
+
+
+def _after_request(response):
+    _record(response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    # Only still pending if after_request never ran (unhandled exception)
+    _record(500)
+
+
+def gauge(name, doc, func):
+    """Expose func() as a gauge, e.g. queue sizes owned by other modules."""
+    registry.register(Gauge(name, doc, func))
+
+
+def init_app(app):
+    database.connection_hooks.append(_on_connect)
+    database.query_hooks.append(_time_query)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(
+            registry.render(), mimetype="text/plain; version=0.0.4; charset=utf-8"
+        )
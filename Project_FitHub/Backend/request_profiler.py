@@ -0,0 +1,244 @@
+import collections
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+from flask import g, request
+
+# On-demand request profiling
+# A request is profiled when an admin sends "X-Profile: cprofile" or
+# "X-Profile: sample", or when it is picked by PROFILE_SAMPLE_RATE (0..1).
+#   cprofile -> <id>.prof, open with pstats/snakeviz
+#   sample   -> <id>.collapsed, a stack sampler's output in the collapsed
+#               format used by flamegraph.pl and speedscope
+# Files go to PROFILE_DIR. At most PROFILE_MAX_PER_MINUTE requests are
+# profiled per worker, and the oldest files are deleted once the directory
+# grows past PROFILE_MAX_DIR_MB.
+# A profile never covers a streamed body (e.g. /events): it is finished when
+# the view returns. The sampler also stops after PROFILE_MAX_SECONDS and keeps
+# at most MAX_STACKS distinct stacks; a cProfile dump is bounded by the number
+# of functions called, not by how long it ran.
+
+HEADER = "X-Profile"
+MODES = ("cprofile", "sample")
+MAX_STACKS = 10000
+# Never picked by PROFILE_SAMPLE_RATE: long-lived streams and the scrape target
+SKIP_SAMPLING = {"dashboard_events", "metrics"}
+
+
+class StackSampler:
+    """Samples one thread's Python stack every interval seconds."""
+
+    def __init__(self, thread_id, interval, max_seconds, max_stacks=MAX_STACKS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.max_stacks = max_stacks
+        self.counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval):
+            if time.monotonic() > deadline:
+                self.counts["[profile stopped: PROFILE_MAX_SECONDS reached]"] += 1
+                return
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                if key not in self.counts and len(self.counts) >= self.max_stacks:
+                    key = "[other stacks: MAX_STACKS reached]"
+                self.counts[key] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            for stack, n in self.counts.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+class RequestProfiler:
+    def __init__(
+        self,
+        directory,
+        sample_rate=0.0,
+        sample_mode="sample",
+        max_per_minute=10,
+        max_dir_mb=50,
+        interval_ms=5,
+        max_seconds=30,
+    ):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.sample_mode = sample_mode
+        self.max_per_minute = max_per_minute
+        self.max_dir_bytes = max_dir_mb * 1024 * 1024
+        self.interval = interval_ms / 1000.0
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._recent = collections.deque()  # start times of recent profiles
+
+    def _allow(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.max_per_minute:
+                return False
+            self._recent.append(now)
+            return True
+
+    def _release(self):
+        # Give back the slot _allow() took for a profile that never started
+        with self._lock:
+            if self._recent:
+                self._recent.pop()
+
+    def choose_mode(self, is_admin):
+        """Return the mode to profile the current request with, or None."""
+        mode = request.headers.get(HEADER)
+        if mode:
+            if mode not in MODES or not is_admin():
+                return None
+        elif (
+            self.sample_rate
+            and request.endpoint not in SKIP_SAMPLING
+            and random.random() < self.sample_rate
+        ):
+            mode = self.sample_mode
+        else:
+            return None
+        return mode if self._allow() else None
+
+    def output_path(self, suffix):
+        rule = request.url_rule
+        route = rule.rule if rule is not None else request.path
+        route = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{route}-{uuid.uuid4().hex[:8]}{suffix}"
+        return os.path.join(self.directory, name)
+
+    def prune(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith((".prof", ".collapsed")):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        while total > self.max_dir_bytes and files:
+            _, size, path = files.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+profiler = None
+
+
+def _before_request(is_admin):
+    mode = profiler.choose_mode(is_admin)
+    if mode is None:
+        return
+    if mode == "cprofile":
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            profiler._release()
+            return
+    else:
+        prof = StackSampler(
+            threading.get_ident(), profiler.interval, profiler.max_seconds
+        )
+        prof.start()
+    g.profile = (
+        mode,
+        prof,
+        profiler.output_path(".prof" if mode == "cprofile" else ".collapsed"),
+    )
+
+
+def _after_request(response):
+    if "profile" in g:
+        if HEADER in request.headers:
+            # Only admins get here with the header; sampled requests must not
+            # learn that they were profiled
+            response.headers["X-Profile-File"] = os.path.basename(g.profile[2])
+        if response.is_streamed:
+            # Teardown waits for the whole stream, which can take hours
+            _finish()
+    return response
+
+
+def _teardown_request(exc):
+    _finish()
+
+
+def _finish():
+    info = g.pop("profile", None)
+    if info is None:
+        return
+    mode, prof, path = info
+    if mode == "cprofile":
+        prof.disable()
+    else:
+        prof.stop()
+
+    try:
+        os.makedirs(profiler.directory, exist_ok=True)
+        if mode == "cprofile":
+            prof.dump_stats(path)
+        else:
+            prof.dump(path)
+        profiler.prune()
+    except OSError as e:
+        print(f"Failed to write profile {path}: {e}")
+
+
+def init_app(app, is_admin):
+    global profiler
+    directory = os.environ.get(
+        "PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles")
+    )
+    sample_mode = os.environ.get("PROFILE_MODE", "sample")
+    if sample_mode not in MODES:
+        sample_mode = "sample"
+    profiler = RequestProfiler(
+        directory,
+        sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", 0)),
+        sample_mode=sample_mode,
+        max_per_minute=int(os.environ.get("PROFILE_MAX_PER_MINUTE", 10)),
+        max_dir_mb=float(os.environ.get("PROFILE_MAX_DIR_MB", 50)),
+        interval_ms=float(os.environ.get("PROFILE_INTERVAL_MS", 5)),
+        max_seconds=float(os.environ.get("PROFILE_MAX_SECONDS", 30)),
+    )
+
+    @app.before_request
+    def start_profile():
+        _before_request(is_admin)
+
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
@@ -1,17 +1,60 @@
 import datetime
-from flask import Flask, jsonify, request, send_from_directory
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    request,
+    send_from_directory,
+    stream_with_context,
+)
 from flask_cors import CORS
+import hmac
 import os
 import uuid
 from Backend.database import init_db, get_db_connection
+from Backend import events, metrics, request_profiler, slow_queries
+from Backend.events import broker
+from Backend.idempotency import idempotent, remember
+from Backend.idempotency import store as idempotency_store
+from Backend.leaderboard import BOARDS, PERIODS, leaderboards
 
 app = Flask(__name__, static_folder="../")
 CORS(app)
 
+
+def is_admin():
+    # Admin/diagnostic endpoints are disabled unless ADMIN_TOKEN is set
+    token = os.environ.get("ADMIN_TOKEN")
+    supplied = request.headers.get("X-Admin-Token", "")
+    return bool(token) and hmac.compare_digest(supplied, token)
+
+
+metrics.init_app(app)
+slow_queries.init_app(app, is_admin)
+request_profiler.init_app(app, is_admin)
+
 # Initialize Database on Startup
 if not os.path.exists("database.db"):
     init_db()
 
+# Load leaderboards (rebuilds from the log tables if the snapshot is stale)
+_conn = get_db_connection()
+leaderboards.load(_conn)
+idempotency_store.ensure_table(_conn)
+_conn.commit()
+_conn.close()
+
+metrics.gauge(
+    "fithub_sse_streams_open",
+    "Open /events streams in this worker.",
+    broker.stream_count,
+)
+metrics.gauge(
+    "fithub_idempotent_requests_in_flight",
+    "Logging requests holding an Idempotency-Key that have not finished yet.",
+    idempotency_store.in_flight_count,
+)
+
 
 @app.route("/")
 def index():
@@ -149,6 +192,7 @@ def forgot_password():
 
     except Exception as e:
         print(f"Failed to send email: {e}")
+        metrics.errors.inc("forgot_password_email")
         # Return success regardless to user
 
     return (
@@ -184,6 +228,15 @@ def profile(user_id):
         )
         conn.commit()
         conn.close()
+
+        broker.publish(
+            user_id,
+            "profile",
+            {
+                key: data.get(key)
+                for key in ("height", "weight", "goal", "gender", "bmi")
+            },
+        )
         return jsonify({"message": "Profile updated"}), 200
     else:
         # GET
@@ -234,21 +287,10 @@ def get_user_meals(user_id):
 
 
 # 4. DASHBOARD & LOGGING
-@app.route("/api/user/<user_id>/dashboard", methods=["GET"])
-def dashboard_stats(user_id):
-    # Fetch real stats from daily_logs
-    conn = get_db_connection()
+def calculate_streak(conn, user_id):
     import datetime
 
     today = datetime.date.today().isoformat()
-
-    # Get today's logs
-    log = conn.execute(
-        "SELECT water_intake, calories_consumed FROM daily_logs WHERE user_id = ? AND date = ?",
-        (user_id, today),
-    ).fetchone()
-
-    # Calculate Streak
     streak = 0
     try:
         # Get all distinct dates for this user, ordered by date DESC
@@ -287,17 +329,69 @@ def dashboard_stats(user_id):
                     break
     except Exception as e:
         print(f"Streak logic error: {e}")
+        metrics.errors.inc("streak")
         streak = 0
 
+    return streak
+
+
+def get_dashboard_snapshot(conn, user_id):
+    import datetime
+
+    today = datetime.date.today().isoformat()
+
+    # Get today's logs
+    log = conn.execute(
+        "SELECT water_intake, calories_consumed FROM daily_logs WHERE user_id = ? AND date = ?",
+        (user_id, today),
+    ).fetchone()
+
+    streak = calculate_streak(conn, user_id)
+
     water = log["water_intake"] if log else 0
     calories = log["calories_consumed"] if log else 0
 
+    return {"streak": streak, "water": water, "calories": calories}
+
+
+@app.route("/api/user/<user_id>/dashboard", methods=["GET"])
+def dashboard_stats(user_id):
+    # Fetch real stats from daily_logs
+    conn = get_db_connection()
+    stats = get_dashboard_snapshot(conn, user_id)
     conn.close()
 
-    return jsonify({"streak": streak, "water": water, "calories": calories})
+    return jsonify(stats)
+
+
+@app.route("/api/user/<user_id>/events", methods=["GET"])
+def dashboard_events(user_id):
+    # Live dashboard updates, pushed by the logging endpoints below
+    q = broker.subscribe(user_id)
+    if q is None:
+        return jsonify({"error": "Too many live streams, try again later"}), 503
+
+    try:
+        conn = get_db_connection()
+        initial = get_dashboard_snapshot(conn, user_id)
+        conn.close()
+    except Exception:
+        broker.unsubscribe(user_id, q)
+        raise
+
+    response = Response(
+        stream_with_context(events.stream(broker, user_id, q, initial=initial)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # The body is never iterated for HEAD (or a client that leaves before the
+    # first chunk), so the generator's cleanup alone would leak the slot
+    response.call_on_close(lambda: broker.unsubscribe(user_id, q))
+    return response
 
 
 @app.route("/api/log/meal", methods=["POST"])
+@idempotent
 def log_meal():
     data = request.json
     user_id = data.get("user_id")
@@ -349,18 +443,39 @@ def log_meal():
             (user_id, meal_name, calories),
         )
 
+        new_total = (log["calories_consumed"] + calories) if log else calories
+        result = {
+            "message": "Meal logged successfully",
+            "new_total": new_total,
+        }
+
+        # Stored in the same transaction so a retried request is replayed, not re-logged
+        remember(conn, result, 200)
         conn.commit()
-        return (
-            jsonify(
-                {
-                    "message": "Meal logged successfully",
-                    "new_total": (
-                        (log["calories_consumed"] + calories) if log else calories
-                    ),
-                }
-            ),
-            200,
-        )
+
+        # The meal is logged now; a failing side effect must not turn that
+        # into an error response (the client would log it again)
+        try:
+            # First log of the day extends the user's streak
+            if not log:
+                leaderboards.record_day(conn, user_id, today)
+
+            # Push the new totals to any open dashboards (first log of the day moves the streak)
+            if broker.has_subscribers(user_id):
+                broker.publish(
+                    user_id,
+                    "meal",
+                    {
+                        "calories": new_total,
+                        "streak": calculate_streak(conn, user_id),
+                        "meal_name": meal_name,
+                    },
+                )
+        except Exception as e:
+            print(f"Post-commit update failed for meal log: {e}")
+            metrics.errors.inc("log_meal_side_effects")
+
+        return jsonify(result), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
     finally:
@@ -410,10 +525,11 @@ def get_workouts():
 
 
 @app.route("/api/log/workout", methods=["POST"])
+@idempotent
 def log_workout():
     data = request.json
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
         # Log workout
         log_id = str(uuid.uuid4())
         today = datetime.date.today().isoformat()
@@ -423,11 +539,38 @@ def log_workout():
             (log_id, data["user_id"], data["workout_id"], today, "completed"),
         )
 
+        result = {"message": "Workout logged successfully"}
+        remember(conn, result, 201)
         conn.commit()
-        conn.close()
-        return jsonify({"message": "Workout logged successfully"}), 201
+
+        # Already logged: report side-effect failures, don't fail the request
+        try:
+            workout = conn.execute(
+                "SELECT calories_burn FROM workouts WHERE id = ?", (data["workout_id"],)
+            ).fetchone()
+            calories = workout["calories_burn"] if workout else 0
+            leaderboards.record_workout(conn, data["user_id"], today, calories)
+
+            broker.publish(
+                data["user_id"],
+                "workout",
+                {
+                    "workout_id": data["workout_id"],
+                    "date": today,
+                    "status": "completed",
+                },
+            )
+        except Exception as e:
+            print(f"Post-commit update failed for workout log: {e}")
+            metrics.errors.inc("log_workout_side_effects")
+
+        return jsonify(result), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        # Also rolls back a failed transaction before @idempotent looks up
+        # the winning request's response
+        conn.close()
 
 
 def seed_workouts():
@@ -480,5 +623,57 @@ def seed_workouts():
     print("Seeded Workouts.")
 
 
+# 6. LEADERBOARDS
+def _leaderboard_args(board):
+    period = request.args.get("period", "weekly")
+    if board not in BOARDS or period not in PERIODS:
+        return None, (
+            jsonify(
+                {
+                    "error": f"Unknown leaderboard. Boards: {', '.join(BOARDS)}; periods: {', '.join(PERIODS)}"
+                }
+            ),
+            404,
+        )
+    return period, None
+
+
+@app.route("/api/leaderboard/<board>", methods=["GET"])
+def get_leaderboard(board):
+    period, error = _leaderboard_args(board)
+    if error:
+        return error
+    limit = max(1, min(request.args.get("limit", 10, type=int), 100))
+
+    entries = leaderboards.top(board, period, limit)
+
+    # Attach display names for the (small) top-K only
+    if entries:
+        ids = [e["user_id"] for e in entries]
+        conn = get_db_connection()
+        rows = conn.execute(
+            f"SELECT id, name FROM users WHERE id IN ({','.join('?' * len(ids))})",
+            ids,
+        ).fetchall()
+        conn.close()
+        names = {r["id"]: r["name"] for r in rows}
+        for e in entries:
+            e["name"] = names.get(e["user_id"])
+
+    return jsonify({"board": board, "period": period, "entries": entries})
+
+
+@app.route("/api/user/<user_id>/leaderboard/<board>", methods=["GET"])
+def get_my_rank(user_id, board):
+    period, error = _leaderboard_args(board)
+    if error:
+        return error
+
+    result = leaderboards.rank(board, period, user_id)
+    result.update({"board": board, "period": period})
+    return jsonify(result)
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    # threaded=True so open /events streams don't block other requests
+    app.run(debug=True, threaded=True)
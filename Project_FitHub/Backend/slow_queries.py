@@ -0,0 +1,184 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from flask import has_request_context, jsonify, request
+
+from Backend import database
+
+# Slow-query log (opt-in)
+# Set SLOW_QUERY_MS to log every statement that takes at least that long
+# (execute + fetches), with the shape of its parameters, the route that ran
+# it and its EXPLAIN QUERY PLAN. Full-table scans are flagged. Aggregated
+# stats are served on /api/admin/slow-queries.
+
+logger = logging.getLogger(__name__)
+
+PLAN_CACHE_SIZE = 256
+
+
+def _normalize(sql):
+    return " ".join(sql.split())
+
+
+def _param_shape(parameters):
+    # Types only: values may be emails, passwords, ...
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {k: type(v).__name__ for k, v in parameters.items()}
+    return [type(v).__name__ for v in parameters]
+
+
+def _route():
+    if not has_request_context():
+        return "<no request>"
+    rule = request.url_rule
+    return f"{request.method} {rule.rule if rule is not None else request.path}"
+
+
+def _full_scans(plan):
+    # "SCAN t" reads every row; "SCAN t USING [COVERING] INDEX i" walks an index
+    return [
+        line
+        for line in plan
+        if line.startswith("SCAN ")
+        and "INDEX" not in line
+        and not line.startswith("SCAN CONSTANT ROW")
+    ]
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms):
+        self.threshold = threshold_ms / 1000.0
+        self._lock = threading.Lock()
+        self._plans = {}  # normalized sql -> plan lines
+        self._stats = {}  # normalized sql -> aggregate dict
+
+    def _explain(self, cursor, sql):
+        with self._lock:
+            plan = self._plans.get(sql)
+        if plan is not None:
+            return plan
+        if cursor.parameters is None:
+            return []  # executemany: no single set of parameters to bind
+
+        try:
+            # A plain sqlite3 cursor so the EXPLAIN itself is not timed/hooked
+            rows = sqlite3.Cursor(cursor.connection).execute(
+                "EXPLAIN QUERY PLAN " + cursor.sql, cursor.parameters
+            )
+            plan = [row[3] for row in rows]
+        except sqlite3.Error as e:
+            plan = [f"<explain failed: {e}>"]
+
+        with self._lock:
+            if len(self._plans) >= PLAN_CACHE_SIZE:
+                self._plans.pop(next(iter(self._plans)))
+            self._plans[sql] = plan
+        return plan
+
+    def hook(self, cursor, seconds):
+        total = cursor.elapsed
+        previous = total - seconds
+        if total < self.threshold:
+            return
+
+        sql = _normalize(cursor.sql)
+        if previous > 0 and previous >= self.threshold:
+            # Logged when its running total crossed the threshold; later
+            # fetches still count toward the execution's time
+            with self._lock:
+                entry = self._stats.get(sql)
+                if entry is not None:
+                    entry["total_ms"] += seconds * 1000
+                    entry["max_ms"] = max(entry["max_ms"], total * 1000)
+            return
+
+        plan = self._explain(cursor, sql)
+        scans = _full_scans(plan)
+        route = _route()
+
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s params=%s plan=%s%s",
+            total * 1000,
+            route,
+            sql,
+            _param_shape(cursor.parameters),
+            " | ".join(plan),
+            " [FULL SCAN]" if scans else "",
+        )
+
+        with self._lock:
+            entry = self._stats.get(sql)
+            if entry is None:
+                entry = self._stats[sql] = {
+                    "sql": sql,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "routes": [],
+                    "plan": plan,
+                    "full_scan": bool(scans),
+                }
+            entry["count"] += 1
+            entry["total_ms"] += total * 1000
+            entry["max_ms"] = max(entry["max_ms"], total * 1000)
+            if route not in entry["routes"]:
+                entry["routes"].append(route)
+
+    def top(self, n, key="total_ms"):
+        with self._lock:
+            entries = [dict(e, routes=list(e["routes"])) for e in self._stats.values()]
+        entries.sort(key=lambda e: e[key], reverse=True)
+        for e in entries[:n]:
+            e["avg_ms"] = e["total_ms"] / e["count"]
+        return entries[:n]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+slow_log = None
+
+
+def init_app(app, is_admin):
+    global slow_log
+    threshold = os.environ.get("SLOW_QUERY_MS")
+    if threshold:
+        try:
+            slow_log = SlowQueryLog(float(threshold))
+        except ValueError:
+            print(
+                f"Slow query log disabled: SLOW_QUERY_MS={threshold!r} is not a number."
+            )
+        else:
+            database.query_hooks.append(slow_log.hook)
+            print(f"Slow query log enabled (>= {threshold} ms).")
+
+    @app.route("/api/admin/slow-queries", methods=["GET", "DELETE"])
+    def slow_queries():
+        if not is_admin():
+            return jsonify({"error": "Forbidden"}), 403
+        if slow_log is None:
+            return (
+                jsonify({"error": "Slow query log is disabled (set SLOW_QUERY_MS)"}),
+                404,
+            )
+
+        if request.method == "DELETE":
+            slow_log.reset()
+            return jsonify({"message": "Slow query stats cleared"}), 200
+
+        limit = max(1, min(request.args.get("limit", 10, type=int), 100))
+        sort = request.args.get("sort", "total_ms")
+        if sort not in ("total_ms", "max_ms", "count"):
+            sort = "total_ms"
+        return jsonify(
+            {
+                "threshold_ms": slow_log.threshold * 1000,
+                "queries": slow_log.top(limit, sort),
+            }
+        )
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    from Backend import database
+
+    # Point the app at a throwaway database before server.py opens one
+    database.DB_NAME = str(tmp_path_factory.mktemp("db") / "database.db")
+    database.init_db()
+
+    from Backend.server import app
+
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,49 @@
+from Backend.events import EventBroker, broker
+
+
+def test_head_request_releases_stream_slot(client):
+    before = broker.stream_count()
+
+    response = client.head("/api/user/u1/events")
+    response.close()
+
+    assert response.status_code == 200
+    assert broker.stream_count() == before
+
+
+def test_unread_get_releases_stream_slot(client):
+    before = broker.stream_count()
+
+    response = client.get("/api/user/u1/events")
+    assert broker.stream_count() == before + 1
+    response.close()
+
+    assert broker.stream_count() == before
+
+
+def test_meal_log_is_pushed_to_open_stream(client):
+    user_id = client.post(
+        "/api/signup", json={"name": "A", "email": "sse@x.com", "password": "p"}
+    ).json["user_id"]
+
+    response = client.get(f"/api/user/{user_id}/events")
+    chunks = iter(response.response)
+    next(chunks)  # retry hint
+    assert b"event: snapshot" in next(chunks)
+
+    client.post(
+        "/api/log/meal", json={"user_id": user_id, "meal_id": "x", "calories": 300}
+    )
+    assert b'"calories": 300' in next(chunks)
+    response.close()
+
+
+def test_one_user_cannot_take_every_slot():
+    broker = EventBroker(max_streams=10, max_per_user=2)
+
+    tabs = [broker.subscribe("greedy") for _ in range(3)]
+
+    assert tabs[2] is None
+    assert broker.subscribe("other") is not None
+    broker.unsubscribe("greedy", tabs[0])
+    assert broker.subscribe("greedy") is not None
@@ -0,0 +1,159 @@
+import datetime
+import uuid
+
+import pytest
+
+from Backend import leaderboard
+from Backend.database import get_db_connection
+from Backend.leaderboard import Leaderboards
+
+
+@pytest.fixture(autouse=True)
+def no_refresh_throttle(monkeypatch):
+    monkeypatch.setattr(leaderboard, "REFRESH_INTERVAL", 0)
+
+
+def _new_user(conn):
+    user_id = str(uuid.uuid4())
+    conn.execute(
+        "INSERT INTO users (id, name, email, password) VALUES (?, ?, ?, ?)",
+        (user_id, "L", f"{user_id}@x.com", "p"),
+    )
+    conn.commit()
+    return user_id
+
+
+def _log_workout(conn, user_id, today):
+    conn.execute(
+        "INSERT INTO user_workouts (id, user_id, workout_id, date, status) VALUES (?, ?, ?, ?, ?)",
+        (str(uuid.uuid4()), user_id, "w", today, "completed"),
+    )
+    conn.commit()
+
+
+def test_two_processes_do_not_lose_workouts(app):
+    # Two Leaderboards instances stand in for two worker processes
+    conn = get_db_connection()
+    first, second = Leaderboards(), Leaderboards()
+    first.load(conn)
+    second.load(conn)
+    user_id = _new_user(conn)
+    today = datetime.date.today().isoformat()
+
+    _log_workout(conn, user_id, today)
+    first.record_workout(conn, user_id, today, 100)
+    _log_workout(conn, user_id, today)
+    second.record_workout(conn, user_id, today, 100)
+
+    for boards in (first, second):
+        assert boards.rank("workouts", "all", user_id)["score"] == 2
+        assert boards.rank("calories", "all", user_id)["score"] == 200
+
+    reloaded = Leaderboards()
+    reloaded.load(conn)
+    assert reloaded.rank("workouts", "all", user_id)["score"] == 2
+
+    rebuilt = Leaderboards()
+    rebuilt.rebuild(conn)
+    assert rebuilt.top("workouts", "all", 1000) == reloaded.top(
+        "workouts", "all", 1000
+    )
+    conn.close()
+
+
+def test_streak_continues_across_processes(app):
+    conn = get_db_connection()
+    first, second = Leaderboards(), Leaderboards()
+    first.load(conn)
+    second.load(conn)
+    user_id = _new_user(conn)
+    today = datetime.date.today()
+    yesterday = today - datetime.timedelta(days=1)
+
+    for boards, day in ((first, yesterday), (second, today)):
+        conn.execute(
+            "INSERT INTO daily_logs (user_id, date) VALUES (?, ?)",
+            (user_id, day.isoformat()),
+        )
+        conn.commit()
+        boards.record_day(conn, user_id, day.isoformat())
+
+    assert second.rank("streak", "all", user_id)["score"] == 2
+    assert first.rank("streak", "all", user_id)["score"] == 2
+    conn.close()
+
+
+def test_other_process_write_is_applied_without_full_reload(app, monkeypatch):
+    conn = get_db_connection()
+    first, second = Leaderboards(), Leaderboards()
+    first.load(conn)
+    second.load(conn)
+    user_id = _new_user(conn)
+    today = datetime.date.today().isoformat()
+
+    full_loads = []
+    load_snapshot = first._load_snapshot
+    monkeypatch.setattr(
+        first,
+        "_load_snapshot",
+        lambda *args: full_loads.append(1) or load_snapshot(*args),
+    )
+
+    _log_workout(conn, user_id, today)
+    second.record_workout(conn, user_id, today, 100)
+
+    assert first.rank("workouts", "all", user_id)["score"] == 1
+    assert first.rank("calories", "weekly", user_id)["score"] == 100
+    assert full_loads == []
+    conn.close()
+
+
+def test_rebuild_matches_incremental_updates(app):
+    conn = get_db_connection()
+    boards = Leaderboards()
+    boards.load(conn)
+    user_id = _new_user(conn)
+    today = datetime.date.today()
+
+    for day in (today - datetime.timedelta(days=1), today):
+        conn.execute(
+            "INSERT INTO daily_logs (user_id, date) VALUES (?, ?)",
+            (user_id, day.isoformat()),
+        )
+        conn.commit()
+        boards.record_day(conn, user_id, day.isoformat())
+        _log_workout(conn, user_id, day.isoformat())
+        boards.record_workout(conn, user_id, day.isoformat(), 50)
+
+    rebuilt = Leaderboards()
+    rebuilt.rebuild(conn)
+    for board in leaderboard.BOARDS:
+        for period in leaderboard.PERIODS:
+            assert rebuilt.rank(board, period, user_id) == boards.rank(
+                board, period, user_id
+            )
+    conn.close()
+
+
+def test_week_rollover_prunes_past_weeks(app):
+    conn = get_db_connection()
+    boards = Leaderboards()
+    boards.load(conn)
+    old_week = leaderboard.week_start(
+        datetime.date.today() - datetime.timedelta(days=7)
+    )
+    conn.execute(
+        "INSERT INTO leaderboard_snapshot (board, period, user_id, score, seq) VALUES ('workouts', ?, 'gone', 3, 0)",
+        (old_week,),
+    )
+    conn.commit()
+
+    boards._week = old_week  # as if the process started last week
+    boards.top("workouts", "weekly", 10)
+
+    periods = {
+        r[0] for r in conn.execute("SELECT DISTINCT period FROM leaderboard_snapshot")
+    }
+    assert old_week not in periods
+    assert leaderboard.ALL_TIME in periods
+    conn.close()
@@ -0,0 +1,173 @@
+import sqlite3
+
+from Backend.leaderboard import leaderboards
+
+
+def _signup(client, email):
+    return client.post(
+        "/api/signup", json={"name": "L", "email": email, "password": "p"}
+    ).json["user_id"]
+
+
+def _locked(*args, **kwargs):
+    raise sqlite3.OperationalError("database is locked")
+
+
+def test_meal_is_logged_when_leaderboard_update_fails(client, monkeypatch):
+    user_id = _signup(client, "meal-side@x.com")
+    monkeypatch.setattr(leaderboards, "record_day", _locked)
+
+    response = client.post(
+        "/api/log/meal", json={"user_id": user_id, "meal_id": "x", "calories": 120}
+    )
+
+    assert response.status_code == 200
+    assert client.get(f"/api/user/{user_id}/dashboard").json["calories"] == 120
+
+
+def test_workout_is_logged_when_leaderboard_update_fails(client, monkeypatch):
+    user_id = _signup(client, "workout-side@x.com")
+    workout_id = client.get("/api/workouts").json[0]["id"]
+    monkeypatch.setattr(leaderboards, "record_workout", _locked)
+
+    response = client.post(
+        "/api/log/workout", json={"user_id": user_id, "workout_id": workout_id}
+    )
+
+    assert response.status_code == 201
+
+
+def test_idempotency_conflict_replays_winner(client, monkeypatch):
+    from Backend.database import get_db_connection
+    from Backend.idempotency import store
+
+    user_id = _signup(client, "race@x.com")
+    workout_id = client.get("/api/workouts").json[0]["id"]
+    body = {"user_id": user_id, "workout_id": workout_id}
+    headers = {"Idempotency-Key": "race-1"}
+
+    # First request wins and stores its response...
+    assert (
+        client.post("/api/log/workout", json=body, headers=headers).status_code == 201
+    )
+    # ...but this worker has not seen it yet (cache miss, DB lookup skipped once)
+    store._cache.clear()
+    real_lookup = store.lookup
+    calls = []
+
+    def lookup_after_first(endpoint, key):
+        calls.append(key)
+        return None if len(calls) == 1 else real_lookup(endpoint, key)
+
+    monkeypatch.setattr(store, "lookup", lookup_after_first)
+
+    response = client.post("/api/log/workout", json=body, headers=headers)
+
+    assert response.status_code == 201
+    assert response.headers["Idempotent-Replayed"] == "true"
+    conn = get_db_connection()
+    count = conn.execute(
+        "SELECT count(*) FROM user_workouts WHERE user_id = ?", (user_id,)
+    ).fetchone()[0]
+    conn.close()
+    assert count == 1
+
+
+def _meal_state(user_id):
+    from Backend.database import get_db_connection
+
+    conn = get_db_connection()
+    rows = conn.execute(
+        "SELECT count(*) FROM food_logs WHERE user_id = ?", (user_id,)
+    ).fetchone()[0]
+    consumed = conn.execute(
+        "SELECT calories_consumed FROM daily_logs WHERE user_id = ?", (user_id,)
+    ).fetchone()[0]
+    conn.close()
+    return rows, consumed
+
+
+def test_repeated_key_replays_stored_response(client):
+    from Backend.idempotency import store
+
+    user_id = _signup(client, "replay@x.com")
+    body = {"user_id": user_id, "meal_id": "x", "calories": 250}
+    headers = {"Idempotency-Key": "replay-1"}
+
+    first = client.post("/api/log/meal", json=body, headers=headers)
+    assert first.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+
+    replays = [client.post("/api/log/meal", json=body, headers=headers)]
+    store._cache.clear()  # as seen by another worker: served from the table
+    replays.append(client.post("/api/log/meal", json=body, headers=headers))
+
+    for replay in replays:
+        assert replay.status_code == 200
+        assert replay.headers["Idempotent-Replayed"] == "true"
+        assert replay.json == first.json
+    assert first.json["new_total"] == 250
+    assert _meal_state(user_id) == (1, 250)
+
+
+def test_key_reused_with_different_body_is_rejected(client):
+    user_id = _signup(client, "reuse@x.com")
+    headers = {"Idempotency-Key": "reuse-1"}
+    body = {"user_id": user_id, "meal_id": "x", "calories": 100}
+    client.post("/api/log/meal", json=body, headers=headers)
+
+    response = client.post(
+        "/api/log/meal", json=dict(body, calories=900), headers=headers
+    )
+
+    assert response.status_code == 422
+    assert _meal_state(user_id) == (1, 100)
+
+
+def test_expired_key_is_processed_again(client):
+    from Backend.database import get_db_connection
+    from Backend.idempotency import store
+
+    user_id = _signup(client, "expired@x.com")
+    body = {"user_id": user_id, "meal_id": "x", "calories": 100}
+    headers = {"Idempotency-Key": "expired-1"}
+    client.post("/api/log/meal", json=body, headers=headers)
+
+    conn = get_db_connection()
+    conn.execute(
+        "UPDATE idempotency_keys SET created_at = created_at - ? WHERE key = ?",
+        (store.ttl + 1, "expired-1"),
+    )
+    conn.commit()
+    conn.close()
+    store._cache.clear()
+
+    response = client.post("/api/log/meal", json=body, headers=headers)
+
+    assert response.status_code == 200
+    assert "Idempotent-Replayed" not in response.headers
+    assert _meal_state(user_id) == (2, 200)
+
+
+def test_cleanup_deletes_expired_keys(client, monkeypatch):
+    from Backend.database import get_db_connection
+    from Backend.idempotency import store
+
+    conn = get_db_connection()
+    conn.execute(
+        "INSERT INTO idempotency_keys (endpoint, key, fingerprint, status, response, created_at) VALUES ('log_meal', 'old-1', '', 200, '{}', 0)"
+    )
+    conn.commit()
+    monkeypatch.setattr(store, "_last_cleanup", 0)
+
+    user_id = _signup(client, "cleanup@x.com")
+    client.post(
+        "/api/log/meal",
+        json={"user_id": user_id, "meal_id": "x", "calories": 1},
+        headers={"Idempotency-Key": "cleanup-1"},
+    )
+
+    keys = {r[0] for r in conn.execute("SELECT key FROM idempotency_keys")}
+    conn.close()
+    assert "old-1" not in keys
+    assert "cleanup-1" in keys
@@ -0,0 +1,105 @@
+import gc
+import sys
+import threading
+
+from Backend import database, metrics, slow_queries
+from Backend.slow_queries import SlowQueryLog
+
+DETAIL_ROUTE = "/api/user/<user_id>/logs/today/detail"
+
+
+def _scrape(client):
+    """Parse /metrics into {sample name with labels: value}."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_metrics_output(client, monkeypatch):
+    client.get("/api/user/u-metrics/logs/today/detail")
+    monkeypatch.setattr(metrics.errors, "_values", {})
+    metrics.errors.inc('a"b\\c\nd')
+
+    samples = _scrape(client)
+    text = "\n".join(samples)
+
+    # Route patterns, not raw paths
+    labels = f'route="{DETAIL_ROUTE}",method="GET"'
+    assert f'fithub_http_requests_total{{{labels},status="200"}}' in samples
+    assert "u-metrics" not in text
+
+    buckets = [
+        (name, value)
+        for name, value in samples.items()
+        if name.startswith(f"fithub_http_request_duration_seconds_bucket{{{labels},")
+    ]
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts)
+    assert buckets[-1][0].endswith('le="+Inf"}')
+    assert (
+        counts[-1] == samples[f"fithub_http_request_duration_seconds_count{{{labels}}}"]
+    )
+
+    assert samples[r'fithub_errors_total{source="a\"b\\c\nd"}'] == 1
+    assert samples[f'fithub_sql_statements_total{{route="{DETAIL_ROUTE}"}}'] > 0
+    assert samples[f'fithub_sql_seconds_total{{route="{DETAIL_ROUTE}"}}'] > 0
+
+
+def test_explain_is_not_counted(client, monkeypatch):
+    def statements():
+        client.get("/api/workouts")
+        return _scrape(client)['fithub_sql_statements_total{route="/api/workouts"}']
+
+    client.get("/api/workouts")  # seeds the table on first use
+    before = statements()
+    without_log = statements() - before
+
+    # The slow-query log runs EXPLAIN QUERY PLAN on the same connection
+    log = SlowQueryLog(0)
+    monkeypatch.setattr(slow_queries, "slow_log", log)
+    monkeypatch.setattr(database, "query_hooks", database.query_hooks + [log.hook])
+    before = statements()
+    with_log = statements() - before
+
+    assert any(e["plan"] for e in log.top(100))
+    assert with_log == without_log
+
+
+def test_connection_collected_on_another_thread_is_uncounted(monkeypatch):
+    unraisable = []
+    monkeypatch.setattr(sys, "unraisablehook", unraisable.append)
+    before = database.open_connections()
+
+    gc.disable()
+    try:
+        conn = database.get_db_connection()
+        conn.self_ref = conn  # only the cyclic GC can free it
+        del conn
+        assert database.open_connections() == before + 1
+
+        thread = threading.Thread(target=gc.collect)
+        thread.start()
+        thread.join()
+    finally:
+        gc.enable()
+
+    assert unraisable == []
+    assert database.open_connections() == before
+
+
+def test_iterating_a_cursor_is_timed(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        database, "query_hooks", [lambda cursor, seconds: calls.append(cursor.sql)]
+    )
+    conn = database.get_db_connection()
+    rows = list(conn.execute("SELECT id FROM workouts"))
+    conn.close()
+
+    # execute() plus one call per row and the final StopIteration
+    assert len(calls) == len(rows) + 2
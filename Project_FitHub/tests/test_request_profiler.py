@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+
+import pytest
+
+from Backend import request_profiler
+from Backend.request_profiler import StackSampler
+
+
+@pytest.fixture
+def profiler(monkeypatch, tmp_path):
+    p = request_profiler.profiler
+    monkeypatch.setattr(p, "directory", str(tmp_path))
+    monkeypatch.setattr(p, "max_per_minute", 100)
+    monkeypatch.setattr(p, "_recent", type(p._recent)())
+    return p
+
+
+def test_sampling_skips_streams_and_metrics(client, profiler, monkeypatch):
+    monkeypatch.setattr(profiler, "sample_rate", 1.0)
+
+    assert "X-Profile-File" not in client.get("/metrics").headers
+    response = client.get("/api/user/u1/events")
+    assert "X-Profile-File" not in response.headers
+    response.close()
+
+    assert os.listdir(profiler.directory) == []
+    client.get("/api/workouts")
+    assert len(os.listdir(profiler.directory)) == 1
+
+
+def test_profile_of_stream_ends_with_the_view(client, profiler, monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "t")
+
+    response = client.get(
+        "/api/user/u1/events", headers={"X-Admin-Token": "t", "X-Profile": "sample"}
+    )
+
+    # Written before any of the stream body is read
+    name = response.headers["X-Profile-File"]
+    assert os.path.exists(os.path.join(profiler.directory, name))
+    response.close()
+
+
+def test_sampler_stops_after_max_seconds():
+    sampler = StackSampler(threading.get_ident(), 0.001, max_seconds=0.01)
+    sampler.start()
+    time.sleep(0.1)
+    samples = sum(sampler.counts.values())
+    time.sleep(0.05)
+
+    assert sum(sampler.counts.values()) == samples
+    sampler.stop()
+
+
+def test_sampled_request_does_not_see_profile_file(client, profiler, monkeypatch):
+    monkeypatch.setattr(profiler, "sample_rate", 1.0)
+    monkeypatch.setenv("ADMIN_TOKEN", "t")
+
+    sampled = client.get("/api/workouts")
+    requested = client.get(
+        "/api/workouts", headers={"X-Admin-Token": "t", "X-Profile": "sample"}
+    )
+
+    assert "X-Profile-File" not in sampled.headers
+    assert requested.headers["X-Profile-File"] in os.listdir(profiler.directory)
+    assert len(os.listdir(profiler.directory)) == 2
+
+
+def test_failed_start_gives_slot_back(client, profiler, monkeypatch):
+    class Busy:
+        def enable(self):
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(request_profiler.cProfile, "Profile", Busy)
+    monkeypatch.setattr(profiler, "max_per_minute", 1)
+    monkeypatch.setenv("ADMIN_TOKEN", "t")
+    headers = {"X-Admin-Token": "t", "X-Profile": "cprofile"}
+
+    assert "X-Profile-File" not in client.get("/api/workouts", headers=headers).headers
+    assert len(profiler._recent) == 0
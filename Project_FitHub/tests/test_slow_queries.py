@@ -0,0 +1,123 @@
+import logging
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from Backend import database, slow_queries
+from Backend.slow_queries import SlowQueryLog
+
+DETAIL_SQL = "SELECT * FROM food_logs WHERE user_id = ?"
+
+
+@pytest.fixture
+def slow_log(app, monkeypatch):
+    # Same wiring as init_app with SLOW_QUERY_MS=0, undone after the test
+    log = SlowQueryLog(0)
+    monkeypatch.setattr(slow_queries, "slow_log", log)
+    monkeypatch.setattr(database, "query_hooks", database.query_hooks + [log.hook])
+    return log
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "t")
+    return {"X-Admin-Token": "t"}
+
+
+def _detail_entry(log):
+    return next(e for e in log.top(100) if e["sql"].startswith(DETAIL_SQL))
+
+
+def test_detail_query_is_logged_as_full_scan(client, slow_log, caplog):
+    with caplog.at_level(logging.WARNING, logger="Backend.slow_queries"):
+        client.get("/api/user/u1/logs/today/detail")
+
+    entry = _detail_entry(slow_log)
+    assert entry["full_scan"] is True
+    assert any(line.startswith("SCAN food_logs") for line in entry["plan"])
+    assert entry["routes"] == ["GET /api/user/<user_id>/logs/today/detail"]
+    logged = [r for r in caplog.records if DETAIL_SQL in r.getMessage()]
+    assert len(logged) == 1
+    assert "[FULL SCAN]" in logged[0].getMessage()
+
+
+def test_statement_is_logged_once_per_execution(client, slow_log):
+    # execute() and fetchall() both report to the hook
+    client.get("/api/user/u1/logs/today/detail")
+    assert _detail_entry(slow_log)["count"] == 1
+
+    client.get("/api/user/u1/logs/today/detail")
+    assert _detail_entry(slow_log)["count"] == 2
+
+
+def test_admin_endpoint_requires_token(client, slow_log, monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.get("/api/admin/slow-queries").status_code == 403
+
+    monkeypatch.setenv("ADMIN_TOKEN", "t")
+    assert client.get("/api/admin/slow-queries").status_code == 403
+    assert (
+        client.delete(
+            "/api/admin/slow-queries", headers={"X-Admin-Token": "wrong"}
+        ).status_code
+        == 403
+    )
+
+
+def test_admin_endpoint_is_404_when_disabled(client, admin, monkeypatch):
+    monkeypatch.setattr(slow_queries, "slow_log", None)
+
+    response = client.get("/api/admin/slow-queries", headers=admin)
+
+    assert response.status_code == 404
+
+
+def test_admin_endpoint_limit_sort_and_reset(client, slow_log, admin):
+    client.get("/api/user/u1/logs/today/detail")
+    client.get("/api/workouts")
+
+    body = client.get("/api/admin/slow-queries?limit=1", headers=admin).json
+    assert body["threshold_ms"] == 0
+    assert len(body["queries"]) == 1
+
+    queries = client.get(
+        "/api/admin/slow-queries?sort=count&limit=100", headers=admin
+    ).json["queries"]
+    counts = [q["count"] for q in queries]
+    assert len(queries) > 1
+    assert counts == sorted(counts, reverse=True)
+    assert all(q["avg_ms"] == q["total_ms"] / q["count"] for q in queries)
+
+    response = client.delete("/api/admin/slow-queries", headers=admin)
+    assert response.status_code == 200
+    # The GET below runs no SQL, so nothing is logged in between
+    assert client.get("/api/admin/slow-queries", headers=admin).json["queries"] == []
+
+
+def test_fetch_time_after_threshold_is_counted():
+    log = SlowQueryLog(10)
+    cursor = SimpleNamespace(
+        sql="SELECT 1", parameters=(), connection=sqlite3.connect(":memory:")
+    )
+    # execute() crosses the threshold, then a slow fetchall() follows
+    for cursor.elapsed, seconds in ((0.02, 0.02), (0.05, 0.03)):
+        log.hook(cursor, seconds)
+
+    (entry,) = log.top(10)
+    assert entry["count"] == 1
+    assert entry["total_ms"] == pytest.approx(50)
+    assert entry["max_ms"] == pytest.approx(50)
+
+
+def test_malformed_threshold_leaves_log_disabled(monkeypatch):
+    monkeypatch.setenv("SLOW_QUERY_MS", "200ms")
+    monkeypatch.setattr(slow_queries, "slow_log", None)
+    monkeypatch.setattr(database, "query_hooks", list(database.query_hooks))
+    hooks = list(database.query_hooks)
+
+    slow_queries.init_app(Flask(__name__), lambda: True)
+
+    assert slow_queries.slow_log is None
+    assert database.query_hooks == hooks